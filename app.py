@@ -1,5 +1,13 @@
+import math
+import numbers
+import os
+import re
+
 import streamlit as st
 import pandas as pd
+import pyarrow.parquet as pq
+
+from risk_data import RISK_COLUMNS, add_risk_columns
 
 st.set_page_config(
     page_title="Texas Diabetes Risk Chatbot",
@@ -8,123 +16,234 @@ st.set_page_config(
 )
 
 # Small CSS polish (safe + subtle)
-st.markdown(
-    """
+APP_CSS = """
     <style>
     .block-container { padding-top: 1.5rem; padding-bottom: 2rem; }
     .stMetric { padding: 0.25rem 0.25rem; }
     </style>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+# Emitted every run on purpose: Streamlit drops elements a rerun doesn't re-send
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 
 # Load your dataset (merged_all)
-data = pd.read_csv("fulldata_with_risk.csv") # <-- replace this with your dataset filename
+# ----------------------------
+# Parquet copy (with risk columns baked in) is produced by convert_to_parquet.py;
+# the CSV is the fallback.
+DATA_PARQUET = "fulldata_with_risk.parquet"
+DATA_CSV = "fulldata_with_risk.csv"
+
+# Only the fields this app actually touches
+DATA_COLUMNS = [
+    "County", "Diabetes", "Obesity", "PM2.5", "Median_Income", "Uninsured",
+    "Risk_Score", "Risk_Rank", "Risk_Percentile", "Risk_Category",
+]
+
+@st.cache_data
+def load_data(path: str, version: str) -> pd.DataFrame:
+    """Read the dataset and prepare it for lookups (cached per dataset version)."""
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=DATA_COLUMNS)
+    else:
+        df = pd.read_csv(path, usecols=lambda c: c in DATA_COLUMNS)
+
+    # Arrow-backed strings: .str methods and equality filters run in C, not per Python object
+    df["County"] = df["County"].astype("string[pyarrow]").str.strip()
+
+    # The Parquet file already carries Risk_Percentile / Risk_Category;
+    # only the CSV fallback needs the enrichment at startup.
+    if not path.endswith(".parquet"):
+        df = add_risk_columns(df)
+    assert RISK_COLUMNS.issubset(df.columns), "dataset is missing risk columns"
+
+    # Downcast numeric columns (percentages/ranks don't need 64-bit precision)
+    # Only columns that are already float, so integer values keep displaying as e.g. "22"
+    for col in ("Diabetes", "Obesity", "PM2.5", "Risk_Score", "Risk_Percentile"):
+        if col in df.columns and df[col].dtype.kind == "f":
+            df[col] = pd.to_numeric(df[col], downcast="float")
+    for col in ("Risk_Rank", "Median_Income", "Uninsured"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    if "Risk_Category" in df.columns:
+        df["Risk_Category"] = pd.Categorical(
+            df["Risk_Category"], categories=["Low", "Moderate", "High"], ordered=True
+        )
 
-data["County"] = data["County"].astype(str).str.strip()
+    # Risk driver flags (simple heuristics), computed once instead of per message.
+    # NaN compares False, so missing values never count as a driver.
+    df["_hi_obesity"] = df["Obesity"] >= 35 if "Obesity" in df.columns else False
+    df["_hi_uninsured"] = df["Uninsured"] >= 15 if "Uninsured" in df.columns else False
+    df["_lo_income"] = df["Median_Income"] <= 60000 if "Median_Income" in df.columns else False
 
-# Build county list (exclude Texas from dropdown)
-counties = sorted(
-    [c for c in data["County"].dropna().unique() if c.lower() != "texas"]
-)
-# Add Risk Category labels (Low / Moderate / High)
-# ----------------------------
-# If Risk_Percentile exists, use it. Otherwise create it from Risk_Score.
-if "Risk_Percentile" not in data.columns and "Risk_Score" in data.columns:
-    # Percentile from score, higher score = higher risk
-    tmp = data.copy()
-    tmp_counties = tmp[tmp["County"].str.lower() != "texas"].copy()
-    tmp_counties["Risk_Percentile"] = tmp_counties["Risk_Score"].rank(pct=True) * 100
-    data = data.merge(
-        tmp_counties[["County", "Risk_Percentile"]],
-        on="County",
-        how="left"
-    )
+    # Display strings for the chat reply, formatted once instead of per message
+    df["_income_fmt"] = df["Median_Income"].map(lambda x: f"${x:,.0f}")
+    df["_risk_fmt"] = df["Risk_Score"].map(lambda x: f"{x:.2f}")
+    df["_rank_fmt"] = df["Risk_Rank"].astype("Int64").astype(str)
+
+    # Statewide row flag, so filters are a bool mask instead of .str.lower() per rerun
+    df["_is_texas"] = df["County"].str.casefold().eq("texas")
+
+    # Index by County so per-county lookups are hash lookups, not boolean masks
+    return df.set_index("County", drop=False)
 
-if "Risk_Category" not in data.columns and "Risk_Percentile" in data.columns:
-    data["Risk_Category"] = pd.cut(
-        data["Risk_Percentile"],
-        bins=[0, 33.33, 66.66, 100],
-        labels=["Low", "Moderate", "High"],
-        include_lowest=True
+@st.cache_data
+def county_list_and_texas(df: pd.DataFrame) -> tuple[list[str], float | None]:
+    """County dropdown list (Texas excluded) and the Texas reference diabetes value."""
+    counties = sorted(
+        df.loc[~df["_is_texas"], "County"].dropna().unique()
     )
 
-# Texas reference value for diabetes (if present)
-texas_diabetes = None
-texas_row = data[data["County"].str.lower() == "texas"]
-if not texas_row.empty and "Diabetes" in data.columns:
-    texas_diabetes = texas_row["Diabetes"].iloc[0]
+    # Texas reference value for diabetes (if present)
+    texas_diabetes = None
+    texas_row = df[df["_is_texas"]]
+    if not texas_row.empty and "Diabetes" in df.columns:
+        texas_diabetes = texas_row["Diabetes"].iloc[0]
+
+    return counties, texas_diabetes
+
+# Shared, read-only helpers: one instance per process via st.cache_resource
+@st.cache_resource
+def county_matcher(counties_key: tuple[str, ...]) -> tuple[re.Pattern, dict[str, str]]:
+    """One compiled regex over all county names plus a lowercase -> original map."""
+    county_map = {c.lower(): c for c in counties_key}
+    # Longest names first so multi-word counties win over shorter alternatives
+    names = sorted(county_map, key=len, reverse=True)
+    pattern = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b")
+    return pattern, county_map
+
+@st.cache_resource
+def sorted_by_risk(path: str, version: str) -> pd.DataFrame:
+    """Counties (Texas excluded) sorted by Risk_Score, highest first; keyed on the dataset version."""
+    df = load_data(path, version)
+    return df[~df["_is_texas"]].sort_values("Risk_Score", ascending=False)
+
+def dataset_path() -> str:
+    """Use the Parquet copy only if it exists and carries the risk columns; else the CSV."""
+    if os.path.exists(DATA_PARQUET) and RISK_COLUMNS.issubset(pq.read_schema(DATA_PARQUET).names):
+        return DATA_PARQUET
+    return DATA_CSV
+
+DATA_PATH = dataset_path()
+# Changes whenever the data file is rebuilt/edited, invalidating every cache keyed on it
+DATA_VERSION = f"{DATA_PATH}:{os.path.getmtime(DATA_PATH)}"
+data = load_data(DATA_PATH, DATA_VERSION)
+counties, texas_diabetes = county_list_and_texas(data)
+county_regex, county_map = county_matcher(tuple(counties))
+
+# Number of most recent chat messages rendered by default
+CHAT_HISTORY_WINDOW = 30
+
+# Columns shown in the Rankings tables
+RANKING_COLS = ("County", "Risk_Category", "Risk_Score", "Risk_Rank", "Diabetes", "Obesity", "Uninsured", "Median_Income")
 
 # Helpers
 # ----------------------------
 def find_county_from_text(user_text: str) -> str | None:
     """Try to find a county name mentioned in the user text."""
-    msg = (user_text or "").lower()
-    for c in counties:
-        if c.lower() in msg:
-            return c
-    return None
+    m = county_regex.search((user_text or "").lower())
+    return county_map[m.group(1)] if m else None
 
 def county_snapshot(county: str) -> dict:
-    row = data.loc[data["County"] == county].iloc[0].to_dict()
+    row = data.loc[county].to_dict()
     return row
 
+def _num(row: dict, col: str) -> float:
+    """row[col] if it is a real number, else NaN (NaN compares False, so no notna guard needed)."""
+    v = row.get(col)
+    return v if isinstance(v, numbers.Real) and v == v else float("nan")
+
 def risk_explanation(row: dict) -> str:
     """Short, user-friendly explanation paragraph."""
     parts = []
 
     # Benchmark vs Texas average diabetes
-    if texas_diabetes is not None and "Diabetes" in row and pd.notna(row["Diabetes"]):
-        if row["Diabetes"] > texas_diabetes:
+    if texas_diabetes is not None:
+        diabetes = _num(row, "Diabetes")
+        if diabetes > texas_diabetes:
             parts.append(f"This county’s diabetes prevalence is **above** the Texas overall value (**{texas_diabetes:.1f}%**).")
-        else:
+        elif diabetes <= texas_diabetes:
             parts.append(f"This county’s diabetes prevalence is **below** the Texas overall value (**{texas_diabetes:.1f}%**).")
 
 # Composite risk label
-    if "Risk_Category" in row and pd.notna(row["Risk_Category"]):
+    if isinstance(row.get("Risk_Category"), str):
         parts.append(f"Overall, the composite risk level is **{row['Risk_Category']}**.")
 
     # Why the risk might be high (simple heuristics)
     drivers = []
-    if "Obesity" in row and pd.notna(row["Obesity"]) and row["Obesity"] >= 35:
+    if row.get("_hi_obesity"):
         drivers.append("higher obesity")
-    if "Uninsured" in row and pd.notna(row["Uninsured"]) and row["Uninsured"] >= 15:
+    if row.get("_hi_uninsured"):
         drivers.append("higher uninsured rate")
-    if "Median_Income" in row and pd.notna(row["Median_Income"]) and row["Median_Income"] <= 60000:
+    if row.get("_lo_income"):
         drivers.append("lower median income")
 
     if drivers:
         parts.append("Key drivers in this profile include " + ", ".join(drivers) + ".")
 
 # PM2.5 note (based on your earlier correlations, it was weak)
-    if "PM2.5" in row and pd.notna(row["PM2.5"]):
+    if not math.isnan(_num(row, "PM2.5")):
         parts.append("PM2.5 is included for context; in this dataset it showed a weaker direct county-level correlation with diabetes than obesity, income, and uninsured rate.")
 
     return " ".join(parts) if parts else "Ask about another county or explore the Rankings tab."
 
 
 # --- Your chatbot function ---
-def chatbot(message):
-    msg = message.lower()
-    
-    for county in data['County']:
-        if county.lower() in msg:
-            row = data[data['County'] == county].iloc[0]
-
-            response = f"""
+CHATBOT_FALLBACK = "I couldn't find that county. Try asking about a Texas county!"
+
+def _format_response(county: str, row: dict) -> str:
+    return f"""
 Here are the health stats for {county}:
 
 • Diabetes rate: {row['Diabetes']}%
 • Obesity rate: {row['Obesity']}%
 • Uninsured: {row['Uninsured']}%
-• Median Income: ${row['Median_Income']:,.0f}
-• Composite Risk Score: {row['Risk_Score']:.2f}
-• Risk Rank (TX counties): {int(row['Risk_Rank'])}
+• Median Income: {row['_income_fmt']}
+• Composite Risk Score: {row['_risk_fmt']}
+• Risk Rank (TX counties): {row['_rank_fmt']}
 """
-            return response
 
-    return "I couldn't find that county. Try asking about a Texas county!"
+@st.cache_resource
+def response_table(path: str, version: str) -> dict[str, str]:
+    """Prebuilt stats reply for every county (Texas excluded); keyed on the dataset version."""
+    df = load_data(path, version)
+    rows = df[~df["_is_texas"]].to_dict("index")
+    return {county: _format_response(county, row) for county, row in rows.items()}
+
+RESPONSES = response_table(DATA_PATH, DATA_VERSION)
+
+def chatbot(county: str) -> str:
+    return RESPONSES.get(county, CHATBOT_FALLBACK)
+
+@st.cache_data
+def build_answer(county: str, version: str) -> str:
+    """Full chat reply for a county, memoized per county and dataset version (``version`` is only a cache key)."""
+    return chatbot(county) + "\n\n**Quick interpretation:** " + risk_explanation(county_snapshot(county))
+
+@st.fragment
+def rankings_view(hi: pd.DataFrame) -> None:
+    """Slider + top/bottom tables; slider changes rerun only this fragment."""
+    lo = hi.iloc[::-1]
+
+    k = st.slider("Show top N counties:", 5, 50, 10)
+
+    left, right = st.columns(2)
+
+    with left:
+        st.markdown(f"### 🔥 Top {k} Highest Risk")
+        st.dataframe(
+            hi.head(k)[list(RANKING_COLS)],
+            use_container_width=True,
+            hide_index=True
+        )
+
+    with right:
+        st.markdown(f"### 🌿 Top {k} Lowest Risk")
+        st.dataframe(
+            lo.head(k)[list(RANKING_COLS)],
+            use_container_width=True,
+            hide_index=True
+        )
 
 # Sidebar Navigation + Quick Lookup
 # ----------------------------
@@ -133,7 +252,16 @@ page = st.sidebar.radio("Go to:", ["Chat", "Rankings", "About"], index=0)
 
 st.sidebar.divider()
 st.sidebar.subheader("Quick County Lookup")
-selected = st.sidebar.selectbox("Select a county:", ["(choose)"] + counties)
+# Search-as-you-type instead of a selectbox holding every county
+q = st.sidebar.text_input("County:", placeholder="Start typing a county name…").strip().lower()
+suggestions = [c for c_lower, c in county_map.items() if c_lower.startswith(q)][:10] if q else []
+if suggestions:
+    # No preselection: picking a county stays an explicit choice
+    selected = st.sidebar.radio("Matches", suggestions, index=None) or "(choose)"
+else:
+    if q:
+        st.sidebar.caption("No matching county.")
+    selected = "(choose)"
 
 if selected != "(choose)":
     row = county_snapshot(selected)
@@ -180,27 +308,7 @@ All analyses are observational and descriptive. Associations shown do **not** im
 if page == "Rankings":
     st.subheader("📊 Composite Risk Rankings (Texas Counties)")
 
-    df_counties = data[data["County"].str.lower() != "texas"].copy()
-
-    k = st.slider("Show top N counties:", 5, 50, 10)
-
-    left, right = st.columns(2)
-
-    with left:
-        st.markdown(f"### 🔥 Top {k} Highest Risk")
-        st.dataframe(
-            df_counties.sort_values("Risk_Score", ascending=False)
-            .head(k)[["County", "Risk_Category", "Risk_Score", "Risk_Rank", "Diabetes", "Obesity", "Uninsured", "Median_Income"]],
-            use_container_width=True
-        )
-
-    with right:
-        st.markdown(f"### 🌿 Top {k} Lowest Risk")
-        st.dataframe(
-            df_counties.sort_values("Risk_Score", ascending=True)
-            .head(k)[["County", "Risk_Category", "Risk_Score", "Risk_Rank", "Diabetes", "Obesity", "Uninsured", "Median_Income"]],
-            use_container_width=True
-        )
+    rankings_view(sorted_by_risk(DATA_PATH, DATA_VERSION))
 
     st.divider()
     st.caption("Rankings exclude the statewide 'Texas' row. Use Texas as a benchmark in the Chat tab.")
@@ -220,8 +328,16 @@ if page == "Chat":
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
-    # Show past messages
-    for m in st.session_state.messages:
+    # Show past messages (only the most recent window unless asked for more)
+    history = st.session_state.messages
+    older = len(history) - CHAT_HISTORY_WINDOW
+    if older > 0 and not st.checkbox(
+        "Show older messages",
+        key="show_older_messages",
+        help=f"{older} earlier message(s) hidden",
+    ):
+        history = history[-CHAT_HISTORY_WINDOW:]
+    for m in history:
         with st.chat_message(m["role"]):
             st.markdown(m["content"])
 
@@ -243,13 +359,8 @@ if page == "Chat":
         if county_found is None:
             answer = "I couldn’t find a Texas county in your message. Try **“Harris County”** or pick one from the sidebar."
         else:
-            row = county_snapshot(county_found)
-
-            # Main stats (your existing chatbot response)
-            answer = chatbot(county_found)
-
-            # Add your short explanation paragraph too
-            answer += "\n\n**Quick interpretation:** " + risk_explanation(row)
+            # Main stats + short explanation paragraph (cached per county)
+            answer = build_answer(county_found, DATA_VERSION)
 
         st.session_state.messages.append({"role": "assistant", "content": answer})
         with st.chat_message("assistant"):
@@ -0,0 +1,17 @@
+import pandas as pd
+
+from risk_data import add_risk_columns
+
+# One-off conversion: CSV -> Parquet (snappy) so app.py can skip CSV parsing
+# and the risk enrichment. Re-run this whenever fulldata_with_risk.csv changes.
+# ----------------------------
+CSV_PATH = "fulldata_with_risk.csv"
+PARQUET_PATH = "fulldata_with_risk.parquet"
+
+
+if __name__ == "__main__":
+    df = pd.read_csv(CSV_PATH)
+    df["County"] = df["County"].astype(str).str.strip()
+    df = add_risk_columns(df)
+    df.to_parquet(PARQUET_PATH, compression="snappy", index=False)
+    print(f"Wrote {PARQUET_PATH} ({len(df)} rows, {len(df.columns)} columns)")
@@ -0,0 +1,31 @@
+import pandas as pd
+import numpy as np
+
+# Risk enrichment shared by app.py (CSV fallback) and convert_to_parquet.py
+# ----------------------------
+RISK_COLUMNS = {"Risk_Percentile", "Risk_Category"}
+
+
+def add_risk_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Fill in Risk_Percentile and Risk_Category (Low / Moderate / High) if missing."""
+    # If Risk_Percentile exists, use it. Otherwise create it from Risk_Score.
+    if "Risk_Percentile" not in df.columns and "Risk_Score" in df.columns:
+        # Percentile from score, higher score = higher risk.
+        # Ties share their average rank, exactly like rank(pct=True).
+        mask = (df["County"].str.lower() != "texas") & df["Risk_Score"].notna()
+        scores = df.loc[mask, "Risk_Score"].to_numpy()
+        ordered = np.sort(scores)
+        first = np.searchsorted(ordered, scores, side="left")
+        last = np.searchsorted(ordered, scores, side="right")
+        df["Risk_Percentile"] = np.nan
+        df.loc[mask, "Risk_Percentile"] = (first + 1 + last) / 2 / len(scores) * 100
+
+    if "Risk_Category" not in df.columns and "Risk_Percentile" in df.columns:
+        pct = df["Risk_Percentile"].to_numpy()
+        df["Risk_Category"] = np.select(
+            [pct <= 33.33, pct <= 66.66, pct <= 100],
+            ["Low", "Moderate", "High"],
+            default=None
+        )
+
+    return df